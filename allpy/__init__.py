@@ -1,57 +1,516 @@
 # -*- coding: utf-8 -*-
 
-from typing import Callable
+import functools
+import warnings
+from typing import Callable, NamedTuple
 import numpy
-from inteq import SolveVolterra
+import numba
+import scipy.linalg
 
 #%% find atomless pdf and cdf for one player
 
 
+class Gtilde(NamedTuple):
+    """
+    Per-player solution in structure-of-arrays layout: each field is one
+    homogeneous array (or scalar), so consumers touch only the fields they
+    use and attribute access is resolved at compile time for the tuple.
+    """
+
+    s: numpy.ndarray
+    pdf: numpy.ndarray
+    cdf: numpy.ndarray
+    sbari: int
+    sbar: float
+    success: bool
+
+
+def _solve_py(
+    sgrid: numpy.ndarray,
+    ci_vals: numpy.ndarray,
+    vi: Callable[[numpy.ndarray, numpy.ndarray], numpy.ndarray],
+    trapezoid: bool = False,
+) -> numpy.ndarray:
+    """
+    Solve the discretized Volterra equation with vectorized numpy and a
+    dense triangular solve. Fallback for kernels that numba cannot
+    compile. The kernel is evaluated only on the lower-triangular index
+    pairs in a single vectorized call, rather than on the full num-by-num
+    grid followed by `numpy.tril` throwing half of it away.
+    """
+    num = sgrid.size
+    rows, cols = numpy.tril_indices(num)
+    # Fortran order so the LAPACK wrapper takes the matrix as-is instead
+    # of copying it
+    ktril = numpy.zeros((num, num), order="F")
+    ktril[rows, cols] = vi(sgrid[rows], sgrid[cols])
+    if trapezoid:
+        # apply trapezoid rule by halving the endpoints
+        numpy.fill_diagonal(ktril, numpy.diag(ktril) / 2)
+        # remember that 0,0 was already halved in the diagonal
+        ktril[:, 0] = ktril[:, 0] + vi(sgrid, 0) / 2
+    # call the LAPACK routine directly, skipping solve_triangular's
+    # per-call validation and function lookup
+    pdfi, info = _trtrs(ktril, numpy.asarray(ci_vals, dtype=numpy.float64), lower=True)
+    if info != 0:
+        raise scipy.linalg.LinAlgError("singular kernel matrix in gtilde")
+    return pdfi
+
+
+# block size for the blocked forward substitution
+_NB = 64
+
+# look up the LAPACK triangular solver once at import time
+_trtrs = scipy.linalg.get_lapack_funcs("trtrs", dtype=numpy.float64)
+
+
+@numba.njit(fastmath=True, inline="always")
+def _kval(
+    vi: Callable[[float, float], float],
+    sgrid: numpy.ndarray,
+    i: int,
+    j: int,
+    trapezoid: bool,
+) -> float:
+    """
+    One entry of the (implicit) lower-triangular kernel matrix, including
+    the endpoint corrections of the trapezoid rule.
+    """
+    kij = vi(sgrid[i], sgrid[j])
+    if trapezoid:
+        # apply trapezoid rule by halving the endpoints
+        if i == j:
+            kij = kij / 2
+        # remember that 0,0 was already halved in the diagonal
+        if j == 0:
+            kij = kij + vi(sgrid[i], 0.0) / 2
+    return kij
+
+
+def _solve_rows(
+    sgrid: numpy.ndarray,
+    rhs: numpy.ndarray,
+    pdfi: numpy.ndarray,
+    cdfi: numpy.ndarray,
+    start: int,
+    vi: Callable[[float, float], float],
+    trapezoid: bool = False,
+) -> int:
+    """
+    Compiled blocked forward substitution with scalar kernel evaluations.
+    Rows below `start` are taken as already solved: their solution is read
+    from `pdfi[:start]` and only the rows from `start` on are computed, so
+    an extended grid reuses all previous work. `rhs` is consumed in place.
+    The CDF is accumulated on the fly while `pdfi` is still in cache, and
+    the index of the last point with CDF at most one is tracked in the
+    same pass and returned, so no separate cumsum or mask pass is needed.
+    Substitution within a diagonal block is sequential; the trailing
+    right-hand-side updates are independent across rows and run in a
+    prange. `vi` must itself be a numba-compiled function.
+    """
+    num = sgrid.size
+    running = 0.0
+    bari = 0
+    if start > 0:
+        running = cdfi[start - 1]
+        bari = start - 1
+        # fold the already-solved prefix into the new right-hand sides
+        for i in numba.prange(start, num):
+            acc = 0.0
+            for j in range(start):
+                acc += _kval(vi, sgrid, i, j, trapezoid) * pdfi[j]
+            rhs[i] -= acc
+    for bstart in range(start, num, _NB):
+        bend = min(bstart + _NB, num)
+        # sequential substitution within the diagonal block
+        for i in range(bstart, bend):
+            acc = 0.0
+            for j in range(bstart, i):
+                acc += _kval(vi, sgrid, i, j, trapezoid) * pdfi[j]
+            pdfi[i] = (rhs[i] - acc) / _kval(vi, sgrid, i, i, trapezoid)
+            running += pdfi[i]
+            cdfi[i] = running
+            if running <= 1.0:
+                bari = i
+        # trailing updates are independent row by row
+        for i in numba.prange(bend, num):
+            acc = 0.0
+            for j in range(bstart, bend):
+                acc += _kval(vi, sgrid, i, j, trapezoid) * pdfi[j]
+            rhs[i] -= acc
+    return bari
+
+
+# compile the substitution twice from the same body: the parallel variant
+# uses the row-block prange, the serial one (prange degrades to range) is
+# for calls from inside the player prange -- nesting parallel regions
+# aborts the process under the workqueue threading layer
+_solve_jit = numba.njit(fastmath=True, parallel=True)(_solve_rows)
+_solve_jit_serial = numba.njit(fastmath=True)(_solve_rows)
+
+
+@numba.njit(parallel=True)
+def _solve_two_players(
+    sgrid: numpy.ndarray,
+    rhs1: numpy.ndarray,
+    rhs2: numpy.ndarray,
+    pdfi: numpy.ndarray,
+    cdfi: numpy.ndarray,
+    start: int,
+    vi1: Callable[[float, float], float],
+    vi2: Callable[[float, float], float],
+    trapezoid: bool = False,
+) -> numpy.ndarray:
+    """
+    Run both players' substitutions in parallel, filling the rows of
+    `pdfi` and `cdfi` in place and returning both sbar indices. The two
+    solves share no data, so a prange over the players keeps both cores
+    busy; each player runs the serial substitution so that no parallel
+    regions nest.
+    """
+    bari = numpy.empty(2, dtype=numpy.int64)
+    for p in numba.prange(2):
+        if p == 0:
+            bari[0] = _solve_jit_serial(
+                sgrid, rhs1, pdfi[0], cdfi[0], start, vi1, trapezoid
+            )
+        else:
+            bari[1] = _solve_jit_serial(
+                sgrid, rhs2, pdfi[1], cdfi[1], start, vi2, trapezoid
+            )
+    return bari
+
+
+@numba.njit(fastmath=True, parallel=True)
+def _solve_shared(
+    sgrid: numpy.ndarray,
+    rhs1: numpy.ndarray,
+    rhs2: numpy.ndarray,
+    pdfi: numpy.ndarray,
+    cdfi: numpy.ndarray,
+    start: int,
+    vi: Callable[[float, float], float],
+    trapezoid: bool = False,
+) -> numpy.ndarray:
+    """
+    Substitution for both players when they share one value function: the
+    kernel matrix is identical, so each entry is evaluated once and
+    applied to both right-hand sides, like a triangular solve with two
+    stacked right-hand-side columns. Halves the kernel evaluations
+    relative to two independent solves.
+    """
+    num = sgrid.size
+    running1 = 0.0
+    running2 = 0.0
+    bari1 = 0
+    bari2 = 0
+    if start > 0:
+        running1 = cdfi[0, start - 1]
+        running2 = cdfi[1, start - 1]
+        bari1 = start - 1
+        bari2 = start - 1
+        # fold the already-solved prefix into the new right-hand sides
+        for i in numba.prange(start, num):
+            acc1 = 0.0
+            acc2 = 0.0
+            for j in range(start):
+                kij = _kval(vi, sgrid, i, j, trapezoid)
+                acc1 += kij * pdfi[0, j]
+                acc2 += kij * pdfi[1, j]
+            rhs1[i] -= acc1
+            rhs2[i] -= acc2
+    for bstart in range(start, num, _NB):
+        bend = min(bstart + _NB, num)
+        # sequential substitution within the diagonal block
+        for i in range(bstart, bend):
+            acc1 = 0.0
+            acc2 = 0.0
+            for j in range(bstart, i):
+                kij = _kval(vi, sgrid, i, j, trapezoid)
+                acc1 += kij * pdfi[0, j]
+                acc2 += kij * pdfi[1, j]
+            kii = _kval(vi, sgrid, i, i, trapezoid)
+            pdfi[0, i] = (rhs1[i] - acc1) / kii
+            pdfi[1, i] = (rhs2[i] - acc2) / kii
+            running1 += pdfi[0, i]
+            cdfi[0, i] = running1
+            if running1 <= 1.0:
+                bari1 = i
+            running2 += pdfi[1, i]
+            cdfi[1, i] = running2
+            if running2 <= 1.0:
+                bari2 = i
+        # trailing updates are independent row by row
+        for i in numba.prange(bend, num):
+            acc1 = 0.0
+            acc2 = 0.0
+            for j in range(bstart, bend):
+                kij = _kval(vi, sgrid, i, j, trapezoid)
+                acc1 += kij * pdfi[0, j]
+                acc2 += kij * pdfi[1, j]
+            rhs1[i] -= acc1
+            rhs2[i] -= acc2
+    bari = numpy.empty(2, dtype=numpy.int64)
+    bari[0] = bari1
+    bari[1] = bari2
+    return bari
+
+
+@numba.njit
+def _solve_retry(
+    sgrid: numpy.ndarray,
+    rhs1: numpy.ndarray,
+    rhs2: numpy.ndarray,
+    vi1: Callable[[float, float], float],
+    vi2: Callable[[float, float], float],
+    ci1: Callable[[float], float],
+    ci2: Callable[[float], float],
+    shared: bool = False,
+    trapezoid: bool = False,
+) -> tuple:
+    """
+    Compiled retry driver: solve both players, and as long as neither CDF
+    crosses one, extend the grid to twice the current bound and resume.
+    Running the whole loop compiled means no Python is re-entered between
+    attempts -- the only interpreter work per eq2p call is one entry into
+    this function. When `shared` is set the players have the same value
+    function and both right-hand sides go through one substitution. All
+    functions must be numba-compiled.
+    """
+    h = sgrid[0]
+    num = sgrid.size
+    pdfi = numpy.empty((2, num), dtype=sgrid.dtype)
+    cdfi = numpy.empty((2, num), dtype=sgrid.dtype)
+    bari = numpy.empty(2, dtype=numpy.int64)
+    start = 0
+    while True:
+        if shared:
+            bari = _solve_shared(
+                sgrid, rhs1, rhs2, pdfi, cdfi, start, vi1, trapezoid
+            )
+        else:
+            bari = _solve_two_players(
+                sgrid, rhs1, rhs2, pdfi, cdfi, start, vi1, vi2, trapezoid
+            )
+        # if either CDF crosses one, then stop -- otherwise extend the grid
+        if cdfi[0, -1] > 1 or cdfi[1, -1] > 1:
+            break
+        start = num
+        num = 2 * num
+        new_sgrid = numpy.empty(num, dtype=sgrid.dtype)
+        new_rhs1 = numpy.empty(num, dtype=sgrid.dtype)
+        new_rhs2 = numpy.empty(num, dtype=sgrid.dtype)
+        new_pdfi = numpy.empty((2, num), dtype=sgrid.dtype)
+        new_cdfi = numpy.empty((2, num), dtype=sgrid.dtype)
+        new_sgrid[:start] = sgrid
+        new_pdfi[:, :start] = pdfi[:, :start]
+        new_cdfi[:, :start] = cdfi[:, :start]
+        for i in range(start, num):
+            si = h * (i + 1)
+            new_sgrid[i] = si
+            new_rhs1[i] = ci1(si)
+            new_rhs2[i] = ci2(si)
+        sgrid = new_sgrid
+        rhs1 = new_rhs1
+        rhs2 = new_rhs2
+        pdfi = new_pdfi
+        cdfi = new_cdfi
+    return sgrid, pdfi, cdfi, bari
+
+
+@functools.lru_cache(maxsize=128)
+def _dispatcher(fn: Callable) -> Callable:
+    """
+    Return `fn` in a form callable from compiled code: numba dispatchers
+    pass through, numba-compiled ufuncs are recompiled from their source
+    function (a DUFunc cannot be typed as an njit argument), and anything
+    else is compiled with numba.njit. Memoized so repeated solves with
+    the same functions reuse the compiled version instead of triggering a
+    fresh compile.
+    """
+    if isinstance(fn, numba.core.dispatcher.Dispatcher):
+        return fn
+    if isinstance(fn, numba.np.ufunc.dufunc.DUFunc):
+        fn = fn._dispatcher.py_func
+    return numba.njit(fn)
+
+
+def _solve(
+    sgrid: numpy.ndarray,
+    ci_vals: numpy.ndarray,
+    vi: Callable[[numpy.ndarray, numpy.ndarray], numpy.ndarray],
+    trapezoid: bool = False,
+) -> tuple:
+    """
+    Dispatch the forward substitution to the compiled kernel if the user's
+    `vi` can be compiled, otherwise fall back to the numpy row loop.
+    Returns the unscaled PDF, its running sum (the CDF), and the index of
+    the last point with CDF at most one.
+    """
+    try:
+        pdfi = numpy.empty(sgrid.size, dtype=sgrid.dtype)
+        cdfi = numpy.empty(sgrid.size, dtype=sgrid.dtype)
+        bari = _solve_jit(
+            sgrid, numpy.array(ci_vals, dtype=sgrid.dtype), pdfi, cdfi, 0,
+            _dispatcher(vi), trapezoid,
+        )
+        return pdfi, cdfi, bari
+    except (TypeError, numba.core.errors.NumbaError):
+        warnings.warn(
+            "value function could not be compiled with numba; "
+            "falling back to the dense solver",
+            RuntimeWarning,
+        )
+        pdfi = _solve_py(sgrid, ci_vals, vi, trapezoid)
+        cdfi = numpy.cumsum(pdfi)
+        return pdfi, cdfi, _sbar_index(cdfi)
+
+
 def gtilde(
     vi: Callable[[numpy.ndarray, numpy.ndarray], numpy.ndarray] = 1,
     ci: Callable[[numpy.ndarray], numpy.ndarray] = lambda x: x,
     b: float = 1,
     num: int = 1000,
     method: str = "midpoint",
-) -> dict:
+    dtype: type = numpy.float64,
+    ci_vals: numpy.ndarray = None,
+) -> Gtilde:
     """
     Calculate the atomless PDF and CDF for each player.
     vi  : function for the player's value that takes two arguments. The first argument is the player's own score and the second argument is the score of the opponent.
     ci  : function for the player's cost with respect to her own score.
     b   : optional float for the upper bound of the estimate (will fail if too low) defaults to 1
     num : optional integer for the number of estimation points. A larger num is more accurate, but is slower
+    dtype : optional numpy float type for the solve. numpy.float32 halves the bytes touched, which is plenty of precision when the solution is only plotted
+    ci_vals : optional precomputed cost values on the grid. Lets callers that solve repeatedly with the same pure ci evaluate it once instead of once per call
     """
     if not isinstance(num, int):
         num = int(num)
     # make a grid of `num` points from (eps > 0) to `b`
     if callable(vi):
-        sgrid, pdfi = SolveVolterra(k=vi, f=ci, a=0, b=b, num=num, method=method)
-        # cumsum the PDF to get atomless CDF
-        cdfi = numpy.cumsum(pdfi * (b/num))
+        trapezoid = _check_method(method)
+        sgrid = _sgrid(b, num, dtype)
+        if ci_vals is None:
+            # evaluate the cost on the whole grid once, outside the solve loop
+            ci_vals = ci(sgrid)
+        # the CDF is accumulated inside the solve, no separate cumsum pass
+        pdfi, cdfi, bari = _solve(sgrid, ci_vals, vi, trapezoid)
+        # scale in place -- the solver hands back a private array
+        numpy.multiply(pdfi, num / b, out=pdfi)
     else:
         # presumably, it's a number of some sort
         # then we have an exact solution for CDF
-        sgrid = numpy.linspace((b / num), b, num)
-        cdfi = ci(sgrid) / vi
-        # invert cumsum to get (scaled) PDF
-        pdfi = numpy.insert(numpy.diff(cdfi), 0, cdfi[0])
-    # find the index of sbar
-    bari = numpy.argmax(sgrid[cdfi <= 1])
-    return {
-        "s": sgrid,
-        "pdf": (pdfi * num),
-        "cdf": cdfi,
-        "sbari": bari,
-        "sbar": sgrid[bari],
-        "success": (cdfi[-1] > 1),
-    }
+        sgrid = _sgrid(b, num, dtype)
+        if ci_vals is None:
+            ci_vals = ci(sgrid)
+        # divide into a preallocated array; ci may hand back sgrid itself
+        cdfi = numpy.divide(ci_vals, vi, out=numpy.empty(num, dtype=dtype))
+        # invert cumsum to get (scaled) PDF -- difference straight into a
+        # preallocated array instead of the diff/insert copy pair
+        pdfi = numpy.empty(num, dtype=dtype)
+        pdfi[0] = cdfi[0]
+        numpy.subtract(cdfi[1:], cdfi[:-1], out=pdfi[1:])
+        # find the index of sbar
+        bari = _sbar_index(cdfi)
+    return _package(sgrid, pdfi, cdfi, bari)
+
+
+def _sbar_index(cdfi: numpy.ndarray) -> int:
+    """
+    Index of the last grid point whose CDF is at most one. The CDF is
+    nondecreasing, so a bisection replaces the boolean mask, the filtered
+    copy, and the argmax over it -- one O(log num) lookup instead of two
+    full passes.
+    """
+    return max(int(numpy.searchsorted(cdfi, 1.0, side="right")) - 1, 0)
+
+
+def _sgrid(b: float, num: int, dtype: type = numpy.float64) -> numpy.ndarray:
+    """
+    Grid of `num` points from (eps > 0) to `b`: the index array scaled by
+    the spacing, matching the h * (i + 1) points the extension driver
+    appends, with one multiply per point instead of linspace's start/step
+    arithmetic.
+    """
+    return numpy.arange(1, num + 1, dtype=dtype) * (b / num)
+
+
+def _check_method(method: str) -> bool:
+    """Validate `method` and return whether the trapezoid rule is requested."""
+    if method == "midpoint":
+        return False
+    elif method == "trapezoid":
+        return True
+    else:
+        raise ValueError("method must be one of 'midpoint', 'trapezoid'")
+
+
+def _package(
+    sgrid: numpy.ndarray, pdfi: numpy.ndarray, cdfi: numpy.ndarray, bari: int
+) -> Gtilde:
+    """
+    Assemble the per-player result from the grid, scaled PDF, CDF, and
+    sbar index. The PDF is scaled in place; callers pass freshly built
+    arrays.
+    """
+    num = sgrid.size
+    return Gtilde(
+        s=sgrid,
+        pdf=numpy.multiply(pdfi, num, out=pdfi),
+        cdf=cdfi,
+        sbari=bari,
+        sbar=sgrid[bari],
+        success=(cdfi[-1] > 1),
+    )
 
 
 #%% 2 player equilibrium function
 
 
+def _gtilde2_extend(
+    v1: Callable,
+    c1: Callable,
+    v2: Callable,
+    c2: Callable,
+    b: float,
+    num: int,
+    dtype: type = numpy.float64,
+) -> tuple:
+    """
+    Solve both players with the compiled kernels, retrying by extension.
+    When the bound `b` is too low, the grid keeps its spacing and grows to
+    twice the current bound instead of being rebuilt: the kernel is only
+    evaluated on the new (row, column) blocks and substitution resumes
+    from the previously computed rows, so no work from failed attempts is
+    thrown away. Note the crossing: player 2 mixes according to player 1's
+    value and cost, and vice versa. Raises a numba error if any of the
+    value or cost functions cannot be compiled.
+    """
+    vi1 = _dispatcher(v1)
+    vi2 = _dispatcher(v2)
+    ci1 = _dispatcher(c1)
+    ci2 = _dispatcher(c2)
+    # grid spacing is fixed by the initial bound and preserved by extension
+    h = b / num
+    sgrid = _sgrid(b, num, dtype)
+    rhs1 = numpy.array(c1(sgrid), dtype=dtype)
+    rhs2 = numpy.array(c2(sgrid), dtype=dtype)
+    # one substitution serves both players when they share a value function
+    sgrid, pdfi, cdfi, bari = _solve_retry(
+        sgrid, rhs1, rhs2, vi1, vi2, ci1, ci2, v1 is v2
+    )
+    b = float(sgrid[-1])
+    player2 = _package(sgrid, pdfi[0] / h, cdfi[0], bari[0])
+    player1 = _package(sgrid, pdfi[1] / h, cdfi[1], bari[1])
+    return player1, player2, b
+
+
 def eq2p(
-    v: tuple = (1.0,), c: tuple = (lambda x: x,), b: float = None, num: int = 1000
+    v: tuple = (1.0,),
+    c: tuple = (lambda x: x,),
+    b: float = None,
+    num: int = 1000,
+    dtype: type = numpy.float64,
 ) -> dict:
     """
     Calculate the equilibrium strategies for two players.
@@ -59,6 +518,7 @@ def eq2p(
     c   : tuple of functions for the players' costs with respect to their own scores.
     b   : optional float for the upper bound of the estimate. Heuristics will be used if not specified
     num : optional integer for the number of estimation points. A larger num is more accurate, but is slower
+    dtype : optional numpy float type for the solve. numpy.float32 halves the bytes touched, which is plenty of precision when the solution is only plotted
     """
 
     # try to intelligently interpret v
@@ -92,31 +552,48 @@ def eq2p(
         else:
             b1 = v1 / (c1(1 / num) * num)
 
-        if callable(v2):
+        if v2 is v1 and c2 is c1:
+            # same value and cost give the same guess -- reuse it
+            b2 = b1
+        elif callable(v2):
             b2 = v2(0, 0) / (c2(1 / num) * num)
         else:
             b2 = v2 / (c2(1 / num) * num)
 
         b = min(b1, b2)
 
-    while True:
-        player2 = gtilde(v1, c1, b, num)
-        player1 = gtilde(v2, c2, b, num)
-        success = any((player1["success"], player2["success"]))
-        # if we succeed, then stop -- otherwise, double b and try again
-        if success:
-            break
-        else:
-            b = 2 * b
+    player1 = None
+    if callable(v1) and callable(v2):
+        try:
+            player1, player2, b = _gtilde2_extend(v1, c1, v2, c2, b, num, dtype)
+        except (TypeError, numba.core.errors.NumbaError):
+            warnings.warn(
+                "value or cost function could not be compiled with numba; "
+                "falling back to the double-and-restart loop",
+                RuntimeWarning,
+            )
+    if player1 is None:
+        while True:
+            player2 = gtilde(v1, c1, b, num, dtype=dtype)
+            player1 = gtilde(v2, c2, b, num, dtype=dtype)
+            success = player1.success or player2.success
+            # if we succeed, then stop -- otherwise, double b and try again
+            if success:
+                break
+            else:
+                b = 2 * b
     # record the sbar index that we got from the above loop
-    bari = min([player1["sbari"], player2["sbari"]])
-    # cut the distributions off
-    g = player1["pdf"][0 : (bari + 1)], player2["pdf"][0 : (bari + 1)]
-    G1, G2 = player1["cdf"][0 : (bari + 1)], player2["cdf"][0 : (bari + 1)]
-    # find the atoms
-    G = (G1 - G1[-1] + 1), (G2 - G2[-1] + 1)
+    bari = min([player1.sbari, player2.sbari])
+    # cut the distributions off -- basic slices are views, nothing is copied
+    g = player1.pdf[0 : (bari + 1)], player2.pdf[0 : (bari + 1)]
+    G1, G2 = player1.cdf[0 : (bari + 1)], player2.cdf[0 : (bari + 1)]
+    # find the atoms -- shift the views in place; the full per-player
+    # arrays are not returned, so no temporaries are needed
+    G1 += 1 - G1[-1]
+    G2 += 1 - G2[-1]
+    G = G1, G2
     # get the grid of s
-    sgrid = player1["s"][0 : (bari + 1)]
+    sgrid = player1.s[0 : (bari + 1)]
     return {
         "s": sgrid,
         "pdf": g,
@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
 
 from allpy import eq2p
+import numba
 import numpy as np
 import matplotlib.pyplot as plt
 
 # define functions
+# compile the value function as a ufunc so the solver uses it directly
+# instead of compiling it on every call
+@numba.vectorize(nopython=True)
 def v(si, sj):
     return 9 / 10 + np.exp(-30 * (si + sj)) / (np.exp(-40) + np.exp(-30 * (si + sj)))
 